@@ -3,6 +3,8 @@ import sqlite3
 import twpath
 import re
 import argparse
+from operator import itemgetter
+from functools import lru_cache
 
 
 port_class_numbers = {'BBS':1, 'BSB':2, 'SBB':3, 'SSB':4, 'SBS':5, 'BSS':6, 'SSS':7, 'BBB':8}
@@ -13,20 +15,11 @@ DEFAULT_DB_NAME = 'tw2002.db'
 DIRECT = '  *** Direct warp available ***'
  
 class Port:
-    sector = None;
-    port_class = None;
-    ore_amt = None;
-    ore_pct = None;
-    org_amt = None;
-    org_pct = None;
-    equ_amt = None;
-    equ_pct = None;
-    last_seen = None;
-    warps = None
+    # fixed attribute layout: no per-instance __dict__ for each of the (potentially thousands of) ports
+    __slots__ = ('sector', 'port_class', 'ore_amt', 'ore_pct', 'org_amt', 'org_pct', 'equ_amt', 'equ_pct', 'last_seen')
 
     def __init__(self, args):
         self.sector, self.port_class, self.ore_amt, self.ore_pct, self.org_amt, self.org_pct, self.equ_amt, self.equ_pct, self.last_seen = args
-        self.warps = {}
 
     def __repr__(self):
         return "Sector: {:4}  Class: {} ({})   Ore: {:4} {:3}%  Org: {:4} {:3}%  Equ: {:4} {:3}%".format(
@@ -38,22 +31,17 @@ class Port:
 
 
 
-def port_score(portA, portB, port_type):
-    pct_score = 0
-    amt_score = 0
-    if(port_type[0] != "?"):
-        pct_score += portA.ore_pct + portB.ore_pct
-        amt_score += portA.ore_amt + portB.ore_amt
-    if(port_type[1] != "?"):
-        pct_score += portA.org_pct + portB.org_pct
-        amt_score += portA.org_amt + portB.org_amt
-    if(port_type[2] != "?"):
-        pct_score += portA.equ_pct + portB.equ_pct
-        amt_score += portA.equ_amt + portB.equ_amt
+# mask_* are 1 for each commodity the port type cares about and 0 for "?", worked out once per run by the caller
+def port_score(portA, portB, mask_ore, mask_org, mask_equ):
+    pct_score = (portA.ore_pct + portB.ore_pct) * mask_ore + (portA.org_pct + portB.org_pct) * mask_org + (portA.equ_pct + portB.equ_pct) * mask_equ
+    amt_score = (portA.ore_amt + portB.ore_amt) * mask_ore + (portA.org_amt + portB.org_amt) * mask_org + (portA.equ_amt + portB.equ_amt) * mask_equ
     return (pct_score, amt_score)
 
 def main(dbname, port_type):
     database = sqlite3.connect(dbname)
+    # read-only analysis: serve pages straight from a memory map instead of read() calls
+    database.execute('PRAGMA mmap_size=268435456')
+    database.execute('PRAGMA query_only=ON')
 
     ports = {}
 
@@ -62,36 +50,25 @@ def main(dbname, port_type):
     port_type = port_type.upper()
     opposite_port_type = port_type.replace("B", "T").replace("S", "B").replace("T", "S")
 
-    pt_regex = "^" + port_type.replace("?", ".") + "$"
-    opt_regex = "^" + opposite_port_type.replace("?", ".") + "$"
-    # print(pt_regex, opt_regex)
+    pt_like = port_type.replace("?", "_")
+    opt_like = opposite_port_type.replace("?", "_")
 
     # get a list of all ports
-    for port in conn.execute('SELECT * FROM ports'):
+    for port in conn.execute('SELECT sector, class, ore_amt, ore_pct, org_amt, org_pct, equ_amt, equ_pct, last_seen FROM ports'):
         p = Port(port)
         ports[p.sector] = p
 
-    # find all the neighboring ports
-    for sector in ports:
-        for warp in conn.execute('SELECT destination FROM warps WHERE source=?', (sector,)):
-            warp = warp[0]
-            # print(sector, warp)
-            if(warp in ports):
-                ports[sector].warps[warp] = True
-        # print(sector, ports[sector].warps)
-
-    # find neighboring ports that offer complementary sales of Org and Equ
+    # find neighboring ports that offer complementary sales of the requested commodities
     candidates = {}
-    for sector in ports:
-        portA = ports[sector]
-        # if(portA.port_class[1:] != 'SB'):
-        if(not re.match(pt_regex, portA.port_class)):
-            continue
-        for warp in portA.warps:
-            portB = ports[warp]
-            # if(portB.port_class[1:] == 'BS'):
-            if(re.match(opt_regex, portB.port_class)):
-                candidates[tuple(sorted([sector, warp]))] = True
+    for sector, warp in conn.execute('''
+        SELECT p1.sector, p2.sector
+        FROM ports p1
+        JOIN warps w ON w.source = p1.sector
+        JOIN ports p2 ON p2.sector = w.destination
+        WHERE p1.class LIKE ? AND p2.class LIKE ?
+        ORDER BY p1.sector, p2.sector
+        ''', (pt_like, opt_like)):
+        candidates[tuple(sorted([sector, warp]))] = True
 
 
     twpath.connect_database(dbname)
@@ -99,15 +76,29 @@ def main(dbname, port_type):
     fighters = twpath.fighter_locations()
     blind_warps = twpath.blind_warps()
 
-    for a_b in sorted(candidates.keys(), key=lambda a_b:port_score(ports[a_b[0]], ports[a_b[1]], port_type)):
+    # a port can be part of several pairs; only route to/from each one once
+    @lru_cache(maxsize=None)
+    def fighter_route(p):
+        return tuple(twpath.dijkstra(p, fighters, reverse=True)[0])
+
+    @lru_cache(maxsize=None)
+    def blind_warp_route(p):
+        return tuple(twpath.dijkstra(p, blind_warps, reverse=True)[0])
+
+    # score each pair once up front rather than from inside the sort key; sorting on the score alone keeps ties in their original order
+    mask_ore, mask_org, mask_equ = [int(c != "?") for c in port_type]
+    scored = [(port_score(ports[a], ports[b], mask_ore, mask_org, mask_equ), (a, b)) for (a, b) in candidates]
+    scored.sort(key=itemgetter(0))
+
+    for _, a_b in scored:
         for p in a_b:
-            fRoute = [str(s) for s in twpath.dijkstra(p, fighters, reverse=True)[0]]
+            fRoute = [str(s) for s in fighter_route(p)]
             print(ports[p], end='')
             if(len(fRoute) > 1):
                 print("\n\t\tRoute from nearest fighter ({} hops):\t{}".format(len(fRoute)-1, ' > '.join(fRoute)))
             else:
                 print(DIRECT)
-            bRoute = [str(s) for s in twpath.dijkstra(p, blind_warps, reverse=True)[0]]
+            bRoute = [str(s) for s in blind_warp_route(p)]
             if(len(bRoute) < len(fRoute)):
                 print("\t\tNearest explored blind warp ({} hops):\t{}".format(len(bRoute)-1, ' > '.join(bRoute)))
 
@@ -101,6 +101,9 @@ def interactive_session(tn):
                         pass
                 else:
                     noNewData += 1
+                    # the server has been quiet for a few idle passes (~0.5s); write out whatever the parser has collected
+                    if(noNewData == 10):
+                        twparser.flush()
 
                 # if(False):
                 if(select.select([sys.stdin,], [], [], 0.0)[0]):
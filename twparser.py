@@ -1,71 +1,128 @@
 #!/usr/bin/python3
 import re
 import sqlite3
+import datetime
 import argparse
-import queue
-import time
-import threading
-from multiprocessing.pool import ThreadPool
 import traceback
+import time
 import sys
 
 # variable for collating the multi-line output of route planning commands
 routeList = None
 
-# our SQLite database
+# our SQLite database, and the one cursor every write goes through.  only the thread doing the parsing ever writes
 database = None
+dbcursor = None
 DEFAULT_DB_NAME = 'tw2002.db'
-dbqueue = queue.Queue()
+
+# number of database writes since the last flush(), and since the last commit
+didWork = 0
+uncommitted = 0
+
+# even while the game keeps talking, commit at least this often (seconds) / after this many writes, so other tools see
+# the data and nothing much is lost if the client dies
+COMMIT_INTERVAL = 1.0
+COMMIT_MAX_WRITES = 1000
+lastCommit = time.monotonic()
+
+# rows staged by the save_* handlers, written out in bulk by flush_pending()
+_pending_ports = []
+_pending_warps = []
+_pending_explored = []
+_pending_fighters = []
 
 # verbosity level for parser output
 verbose = 0
 
-# sync flag for threads to exit
-QUITTING_TIME = False
-
 port_class_numbers = {'BBS':1, 'BSB':2, 'SBB':3, 'SSB':4, 'SBS':5, 'BSS':6, 'SSS':7, 'BBB':8}
 port_class_sales =   {1:'BBS', 2:'BSB', 3:'SBB', 4:'SSB', 5:'SBS', 6:'BSS', 7:'SSS', 8:'BBB'}
 
+# all of the line patterns are bytes: game lines are matched without being decoded, and only the few text fields we store get decoded
+
 # pattern matching the port list from Computer Interrogation Mode (CIM)
-portListRe = re.compile('^(?P<sector>[ 0-9]{3}[0-9]) (?P<ore_bs>[ -]) (?P<ore_amt>[ 0-9]{3}[0-9]) (?P<ore_pct>[ 0-9]{2}[0-9])% (?P<org_bs>[ -]) (?P<org_amt>[ 0-9]{3}[0-9]) (?P<org_pct>[ 0-9]{2}[0-9])% (?P<equ_bs>[ -]) (?P<equ_amt>[ 0-9]{3}[0-9]) (?P<equ_pct>[ 0-9]{2}[0-9])%$')
+portListRe = re.compile(rb'^(?P<sector>[ 0-9]{3}[0-9]) (?P<ore_bs>[ -]) (?P<ore_amt>[ 0-9]{3}[0-9]) (?P<ore_pct>[ 0-9]{2}[0-9])% (?P<org_bs>[ -]) (?P<org_amt>[ 0-9]{3}[0-9]) (?P<org_pct>[ 0-9]{2}[0-9])% (?P<equ_bs>[ -]) (?P<equ_amt>[ 0-9]{3}[0-9]) (?P<equ_pct>[ 0-9]{2}[0-9])%$')
 
 # pattern to match the list of warps out of each known sector from the CIM report
-warpListRe = re.compile('^(?P<sector>[ 0-9]{3}[0-9])(?P<warps>(?: [ 0-9]{3}[0-9])+)$')
+warpListRe = re.compile(rb'^(?P<sector>[ 0-9]{3}[0-9])(?P<warps>(?: [ 0-9]{3}[0-9])+)$')
 
 # various patterns to match route planning, either via Computer Interrogation Mode (CIM) or Computer -> F Course Plotter (CF) mode
-routeListFromCIMRe = re.compile("^FM > [0-9]+$")
-routeListFromCFRe = re.compile("^The shortest path .* from sector [0-9]+ to sector [0-9]+ is:$")
-routeListRestRe = re.compile("^(?:  TO)?[0-9 ()>]+$")
-routeListCompleteCIMRe = re.compile("^FM > [0-9]+   TO > [0-9]+ (?P<route>[0-9 ()>]+)$")
-routeListCompleteCFRe = re.compile("^The shortest path .* from sector [0-9]+ to sector [0-9]+ is: (?P<route>[0-9 ()>]+)$")
+routeListFromCIMRe = re.compile(rb"^FM > [0-9]+$")
+routeListFromCFRe = re.compile(rb"^The shortest path .* from sector [0-9]+ to sector [0-9]+ is:$")
+routeListRestRe = re.compile(rb"^(?:  TO)?[0-9 ()>]+$")
+routeListCompleteCIMRe = re.compile(rb"^FM > [0-9]+   TO > [0-9]+ (?P<route>[0-9 ()>]+)$")
+routeListCompleteCFRe = re.compile(rb"^The shortest path .* from sector [0-9]+ to sector [0-9]+ is: (?P<route>[0-9 ()>]+)$")
 
 # maintain a list of deployed fighters, so we can calculate the nearest transwarp point for any given sector
-clearFightersRe = re.compile("^\s*Deployed  Fighter  Scan")
-saveFightersRe = re.compile("^ (?P<sector>[0-9 ]{4}[0-9])\s+[0-9]+\s+(?:Personal|Corp)\s+(?:Defensive|Offensive|Toll)")
+clearFightersRe = re.compile(rb"^\s*Deployed  Fighter  Scan")
+saveFightersRe = re.compile(rb"^ (?P<sector>[0-9 ]{4}[0-9])\s+[0-9]+\s+(?:Personal|Corp)\s+(?:Defensive|Offensive|Toll)")
 
 # keep track of planet locations
-planetListRe = re.compile("^\s*(?P<sector>[0-9 ]{4}[0-9])\s+T?\s+#(?P<id>[0-9]+)\s+(?P<name>.*?)\s+Class (?P<class>[A-Z]), .*(?P<citadel>No Citadel|Level [0-9])")
+planetListRe = re.compile(rb"^\s*(?P<sector>[0-9 ]{4}[0-9])\s+T?\s+#(?P<id>[0-9]+)\s+(?P<name>.*?)\s+Class (?P<class>[A-Z]), .*(?P<citadel>No Citadel|Level [0-9])")
+
+# all of the single-line patterns above, fused into one alternation so each line only goes through the regex engine once;
+# the named group that matched tells us which pattern it was.  inner groups are made non-capturing, since the names
+# repeat between patterns -- the individual pattern is re-run on a hit to pull out its fields
+def _alternative(name, regex):
+    return b'(?P<' + name.encode('ascii') + b'>' + re.sub(rb'\(\?P<[a-z_]+>', b'(?:', regex.pattern) + b')'
+
+_LINE_RE = re.compile(b'|'.join(_alternative(name, regex) for name, regex in (
+    ('clearf', clearFightersRe),
+    ('savef', saveFightersRe),
+    ('warp', warpListRe),
+    ('port', portListRe),
+    ('planet', planetListRe),
+    ('rccim', routeListCompleteCIMRe),
+    ('rccf', routeListCompleteCFRe),
+    ('rfcim', routeListFromCIMRe),
+    ('rfcf', routeListFromCFRe),
+    )))
+
+# looser, multi-line version of _LINE_RE for scanning a whole log buffer at once (parse_game_buffer).  lines in the buffer
+# still carry their trailing whitespace, so every "$" is allowed to skip some first; anything it finds is re-checked
+# line by line, so matching too much is harmless.  the leading newline gives the regex engine a literal to hunt for,
+# which is far quicker than trying a "^" at every byte.  whitespace must not match "\n" here, or a run of blank lines
+# gets rescanned from every newline in it
+_SCAN_SPACE = rb'[^\S\n]'
+_LINE_SCAN_RE = re.compile(b'\n(?:' + _LINE_RE.pattern.replace(rb'\s', _SCAN_SPACE).replace(b'$', _SCAN_SPACE + b'*$') + b')',
+                           re.MULTILINE)
+
+# anything that can make a line invalid UTF-8
+_HIGH_BYTES = bytes(range(0x80, 0x100))
+
+# routes look like "1 > 2 > (3)"; turning the punctuation into spaces leaves just the sector numbers for split()
+_ROUTE_SEPARATORS = bytes.maketrans(b'()>', b'   ')
+
+# every pattern in _LINE_RE starts (after optional whitespace) with a sector number, "Deployed", "FM" or "The",
+# so most lines can be ruled out on their first character without running a regex at all
+_LINE_STARTS = frozenset(bytes([c]) for c in b'0123456789DFT')
 
 # from https://stackoverflow.com/questions/14693701/how-can-i-remove-the-ansi-escape-sequences-from-a-string-in-python
-def strip_ansi(inString):
-    ansi_escape_8bit = re.compile(br'''
-        (?: # either 7-bit C1, two bytes, ESC Fe (omitting CSI)
-            \x1B
-            [@-Z\\-_]
-        |   # or a single 8-bit byte Fe (omitting CSI)
-            [\x80-\x9A\x9C-\x9F]
-        |   # or CSI + control codes
-            (?: # 7-bit CSI, ESC [ 
-                \x1B\[
-            |   # 8-bit CSI, 9B
-                \x9B
-            )
-            [0-?]*  # Parameter bytes
-            [ -/]*  # Intermediate bytes
-            [@-~]   # Final byte
+_ANSI_RE = re.compile(br'''
+    (?: # either 7-bit C1, two bytes, ESC Fe (omitting CSI)
+        \x1B
+        [@-Z\\-_]
+    |   # or a single 8-bit byte Fe (omitting CSI)
+        [\x80-\x9A\x9C-\x9F]
+    |   # or CSI + control codes
+        (?: # 7-bit CSI, ESC [ 
+            \x1B\[
+        |   # 8-bit CSI, 9B
+            \x9B
         )
-    ''', re.VERBOSE)
-    return ansi_escape_8bit.sub(b'', inString)
+        [0-?]*  # Parameter bytes
+        [ -/]*  # Intermediate bytes
+        [@-~]   # Final byte
+    )
+''', re.VERBOSE)
+
+# every sequence _ANSI_RE removes begins with ESC or an 8-bit C1 byte
+_ANSI_LEAD_BYTES = b'\x1b' + bytes(range(0x80, 0xa0))
+
+def strip_ansi(inString):
+    # fast path: most lines have no escape sequences in them at all
+    if(len(inString.translate(None, _ANSI_LEAD_BYTES)) == len(inString)):
+        return inString
+    return _ANSI_RE.sub(b'', inString)
 
 
 def log(msg, logLevel):
@@ -75,141 +132,169 @@ def log(msg, logLevel):
     print("[LogLevel {}]: {}".format(logLevel, msg), flush=True)
 
 def clear_fighter_locations():
-    global database
+    global dbcursor
     log("clear_fighter_locations", 1)
-    c = database.cursor()
-    c.execute('DELETE FROM fighters')
-    database.commit()
+    # anything staged before the new scan would be deleted anyway
+    del _pending_fighters[:]
+    dbcursor.execute('DELETE FROM fighters')
 
 def save_fighter_location(match):
-    global database
     sector = int(match.group('sector').strip())
     log("save_fighter_location: {}".format(sector), 1)
 
-    c = database.cursor()
-    c.execute('REPLACE INTO fighters (sector) VALUES(?)', (sector,))
-    database.commit()
+    _pending_fighters.append((sector,))
 
 def save_warp_list(match):
-    global database
     sector = int(match.group('sector').strip())
-    warps = re.findall('[0-9]+', match.group('warps'))
+    warps = match.group('warps').split()
     log("save_warp_list: {}, {}".format(sector, warps), 1)
-    c = database.cursor()
     # special case: this is the first sector; clear our Explored list so we can repopulate it fresh
     # if(sector == 1 and warps == ['2', '3', '4', '5', '6', '7']):
     #     print("DELETE")
     #     c.execute('DELETE FROM explored')
     # on second thought, we can never "un-discover" a sector anyway so this is pointless
-    c.execute('''
-        REPLACE into explored (sector)
-        VALUES(?)
-        ''', (sector,))
-    for warp in warps:
-        c.execute('''
-            REPLACE INTO warps (source, destination)
-            VALUES(?, ?)
-            ''', (sector, int(warp))
-        )
-    database.commit()
+    _pending_explored.append((sector,))
+    _pending_warps.extend((sector, int(warp)) for warp in warps)
 
 
 def save_port_list(match):
-    global database
     log("save_port_list: {}".format(match.groups()), 1)
-    port_class = (match.group('ore_bs') + match.group('org_bs') + match.group('equ_bs')).replace(' ', 'S').replace('-', 'B')
-
-    c = database.cursor()
-    c.execute('''
-        REPLACE INTO ports (sector, class, ore_amt, ore_pct, org_amt, org_pct, equ_amt, equ_pct, last_seen)
-        VALUES(?, ?, ?, ?, ?, ?, ?, ?, date('now'))
-        ''', (
-            int(match.group('sector').strip()),
-            port_class,
-            int(match.group('ore_amt').strip()),
-            int(match.group('ore_pct').strip()),
-            int(match.group('org_amt').strip()),
-            int(match.group('org_pct').strip()),
-            int(match.group('equ_amt').strip()),
-            int(match.group('equ_pct').strip()),
-            )
-    )
-    database.commit()
+    port_class = (match.group('ore_bs') + match.group('org_bs') + match.group('equ_bs')).decode('ascii').replace(' ', 'S').replace('-', 'B')
+
+    _pending_ports.append((
+        int(match.group('sector').strip()),
+        port_class,
+        int(match.group('ore_amt').strip()),
+        int(match.group('ore_pct').strip()),
+        int(match.group('org_amt').strip()),
+        int(match.group('org_pct').strip()),
+        int(match.group('equ_amt').strip()),
+        int(match.group('equ_pct').strip()),
+        ))
 
 def save_planet_list(match):
-    global database
+    global dbcursor
     log("save_planet_list: {}".format(match.groups()), 1)
-    c = database.cursor()
 
-    citadel = match.group('citadel').strip()[-1]
-    if(citadel == 'l'): # "No Citadel"
-        citadel = '0'
-    c.execute('''
-        REPLACE INTO planets (sector, id, name, class, citadel)
+    citadel = match.group('citadel').strip()[-1:]
+    if(citadel == b'l'): # "No Citadel"
+        citadel = b'0'
+    dbcursor.execute('''
+        INSERT INTO planets (sector, id, name, class, citadel)
         VALUES(?, ?, ?, ?, ?)
+        ON CONFLICT(id) DO UPDATE SET
+            sector=excluded.sector, name=excluded.name, class=excluded.class, citadel=excluded.citadel
         ''', (
             int(match.group('sector').strip()),
             int(match.group('id').strip()),
-            match.group('name').strip(),
-            match.group('class').strip(),
+            match.group('name').strip().decode('utf-8'),
+            match.group('class').strip().decode('ascii'),
             int(citadel)
             )
     )
-    database.commit()
 
 def save_route_list(match):
-    global database
-    route = re.findall('[0-9]+', match.group('route'))
+    route = match.group('route').translate(_ROUTE_SEPARATORS).split()
     log("save_route_list: {}".format(route), 1)
 
-    c = database.cursor()
-    for i in range(len(route)-1):
-        # print(route[i], route[i+1])
-        c.execute('''
-            REPLACE INTO warps (source, destination)
-            VALUES(?, ?)
-            ''', (int(route[i]), int(route[i+1]))
+    _pending_warps.extend((int(route[i]), int(route[i+1])) for i in range(len(route)-1))
+
+# insert-or-ignore / upserts rather than REPLACE, which deletes and re-inserts the row on every conflict
+def flush_pending():
+    global dbcursor
+    global _pending_ports
+    global _pending_warps
+    global _pending_explored
+    global _pending_fighters
+
+    # swap the lists out first, so a failed write can't leave bad rows behind to be retried forever
+    ports, warps, explored, fighters = _pending_ports, _pending_warps, _pending_explored, _pending_fighters
+    _pending_ports, _pending_warps, _pending_explored, _pending_fighters = [], [], [], []
+    log("flush_pending: {} ports, {} warps, {} explored, {} fighters".format(len(ports), len(warps), len(explored), len(fighters)), 1)
+
+    c = dbcursor
+    if(len(ports)):
+        # same value SQLite's date('now') would give, but worked out once for the whole batch
+        today = datetime.datetime.now(datetime.timezone.utc).date().isoformat()
+        c.executemany('''
+            INSERT INTO ports (sector, class, ore_amt, ore_pct, org_amt, org_pct, equ_amt, equ_pct, last_seen)
+            VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(sector) DO UPDATE SET
+                class=excluded.class,
+                ore_amt=excluded.ore_amt, ore_pct=excluded.ore_pct,
+                org_amt=excluded.org_amt, org_pct=excluded.org_pct,
+                equ_amt=excluded.equ_amt, equ_pct=excluded.equ_pct,
+                last_seen=excluded.last_seen
+            ''', [port + (today,) for port in ports]
         )
-    database.commit()
+    c.executemany('''
+        INSERT OR IGNORE INTO explored (sector)
+        VALUES(?)
+        ''', explored
+    )
+    c.executemany('''
+        INSERT OR IGNORE INTO warps (source, destination)
+        VALUES(?, ?)
+        ''', warps
+    )
+    c.executemany('INSERT OR IGNORE INTO fighters (sector) VALUES(?)', fighters)
 
 
 def db_queue(func, *args):
-    dbqueue.put((func, *args))
+    global didWork
+    global uncommitted
+    didWork += 1
+    uncommitted += 1
+    try:
+        return func(*args)
+    except Exception:
+        traceback.print_exc()
 
 
 def parse_game_line(line, dbWriter=True):
     global routeList
-    try:
-        strippedLine = strip_ansi(line).decode('utf-8').rstrip()
-    except:
-        return
+    # checked on every line, parseable or not, so a steady stream of game output can't hold a transaction open
+    if(uncommitted and (uncommitted >= COMMIT_MAX_WRITES or time.monotonic() - lastCommit >= COMMIT_INTERVAL)):
+        commit()
+    strippedLine = strip_ansi(line).rstrip()
+    # lines that aren't valid UTF-8 are line noise; skip them like we always have.  only lines with high bytes need checking
+    if(len(strippedLine.translate(None, _HIGH_BYTES)) != len(strippedLine)):
+        try:
+            strippedLine.decode('utf-8')
+        except UnicodeDecodeError:
+            return
     log("parse_game_line: {}".format((strippedLine,)), 3)
 
-    clearFighters = clearFightersRe.match(strippedLine)
-    if(clearFighters):
+    kind = None
+    if(strippedLine.lstrip()[:1] in _LINE_STARTS):
+        lineMatch = _LINE_RE.match(strippedLine)
+        kind = lineMatch.lastgroup if lineMatch else None
+
+    if(kind == 'clearf'):
+        clearFighters = clearFightersRe.match(strippedLine)
         log("clearFighters: {}".format(clearFighters), 2)
         db_queue(clear_fighter_locations)
         return
 
-    saveFighters = saveFightersRe.match(strippedLine)
-    if(saveFighters):
+    if(kind == 'savef'):
+        saveFighters = saveFightersRe.match(strippedLine)
         log("saveFighters: {}".format(saveFighters), 2)
         db_queue(save_fighter_location,saveFighters)
 
-    warpList = warpListRe.match(strippedLine)
-    if(warpList):
+    if(kind == 'warp'):
+        warpList = warpListRe.match(strippedLine)
         # print(strippedLine, warpList.groups())
         db_queue(save_warp_list,warpList)
         return
 
-    portList = portListRe.match(strippedLine)
-    if(portList):
+    if(kind == 'port'):
+        portList = portListRe.match(strippedLine)
         # print(strippedLine, portList.groups())
         db_queue(save_port_list,portList)
         return
 
-    planetList = planetListRe.match(strippedLine)
-    if(planetList):
+    if(kind == 'planet'):
+        planetList = planetListRe.match(strippedLine)
         log("planetList: {}".format(planetList.groups()), 2)
         db_queue(save_planet_list,planetList)
 
@@ -217,77 +302,89 @@ def parse_game_line(line, dbWriter=True):
         if(len(strippedLine) == 0):
             strippedLine = routeList
             routeList = None
+            lineMatch = _LINE_RE.match(strippedLine)
+            kind = lineMatch.lastgroup if lineMatch else None
         else:
             if(routeListRestRe.match(strippedLine)):
-                routeList += " " + strippedLine
+                routeList += b" " + strippedLine
             else:
                 routeList = None
 
-    routeListComplete = routeListCompleteCIMRe.match(strippedLine)
-    if(routeListComplete):
-        db_queue(save_route_list,routeListComplete)
+    if(kind == 'rccim'):
+        db_queue(save_route_list,routeListCompleteCIMRe.match(strippedLine))
         return
-    routeListComplete = routeListCompleteCFRe.match(strippedLine)
-    if(routeListComplete):
-        db_queue(save_route_list,routeListComplete)
+    if(kind == 'rccf'):
+        db_queue(save_route_list,routeListCompleteCFRe.match(strippedLine))
         return
  
     # route listings are multi-line.  accumulate the lines, then we'll process it once it's complete
-    routeListFrom = routeListFromCIMRe.match(strippedLine)
-    if(routeListFrom):
-        routeList = strippedLine
-        return
-    routeListFrom = routeListFromCFRe.match(strippedLine)
-    if(routeListFrom):
+    if(kind in ('rfcim', 'rfcf')):
         routeList = strippedLine
         return
 
-def dbqueue_service(dbname):
-    global database
-    global dbqueue
-    global QUITTING_TIME
-    database = sqlite3.connect(dbname)
-
-    didWork = False
-    while(True):
-        try:
-            func, *args = dbqueue.get(block=False)
-            if(len(args)):
-                log("dbqueue_service: {}({})".format(func, *args), 1)
-                func(*args)
-            else:
-                log("dbqueue_service: {}()".format(func),1)
-                func()
-            didWork += 1
-        except queue.Empty:
-            if(didWork):
-                if(didWork > 1):
-                    # if we had a queue, flash the screen to indicate that all database operations are complete
-                    print("\x1b[?5h\x1b[?5l", flush=True, end='')
-                didWork = 0
-            if(QUITTING_TIME):
+def parse_game_buffer(buf):
+    # batch version of parse_game_line for a whole log: one regex scan over the buffer finds the lines worth looking at
+    # instead of looping over every line in Python.  escape sequences never span a newline, so they can all be stripped up front
+    buf = b'\n' + strip_ansi(buf)
+    pos = 0 # always at the newline in front of the next line
+    while(pos < len(buf) - 1):
+        # a multi-line route listing needs to see every line until it's complete
+        if(not routeList):
+            match = _LINE_SCAN_RE.search(buf, pos)
+            if(not match):
                 break
-            time.sleep(1)
-        except Exception:
-            traceback.print_exc()
-
-def dbqueue_monitor():
-    global dbqueue
-    global QUITTING_TIME
-
-    cnt = 0
-    while(True):
-        cnt += 1
-        if((cnt % 10) == 0):
-            log("dbqueue_monitor: {} queued items".format(dbqueue.qsize()), 1)
-        if(QUITTING_TIME):
-            break
-        time.sleep(1)
+            pos = match.start()
+        end = buf.find(b'\n', pos + 1)
+        if(end < 0):
+            end = len(buf)
+        parse_game_line(buf[pos + 1:end])
+        pos = end
+
+def _tune(conn):
+    # WAL + relaxed syncing avoids an fsync per commit; bigger page cache and in-memory temp tables for the hot tables
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    conn.execute('PRAGMA cache_size=-20000')
+    conn.execute('PRAGMA busy_timeout=5000')
+
+# write out the staged rows and commit everything since the last commit in one transaction
+def commit():
+    global database
+    global uncommitted
+    global lastCommit
+    try:
+        flush_pending()
+        database.commit()
+    except Exception:
+        traceback.print_exc()
+        database.rollback()
+    uncommitted = 0
+    lastCommit = time.monotonic()
+
+# called when the game goes quiet, and by quit(): commit whatever is left, and tell the user it's all in
+def flush():
+    global didWork
+    if(didWork == 0):
+        return
+    if(uncommitted):
+        commit()
+    if(didWork > 1):
+        # if we wrote a batch, flash the screen to indicate that all database operations are complete
+        print("\x1b[?5h\x1b[?5l", flush=True, end='')
+    didWork = 0
 
 def database_connect(dbname):
-    initdb = sqlite3.connect(dbname)
+    global database
+    global dbcursor
+    # the port and planet upserts (INSERT ... ON CONFLICT DO UPDATE) need SQLite 3.24 or newer
+    if(sqlite3.sqlite_version_info < (3, 24, 0)):
+        raise RuntimeError("SQLite 3.24 or newer is required; this Python is using SQLite {}".format(sqlite3.sqlite_version))
+    database = sqlite3.connect(dbname)
+    _tune(database)
+    dbcursor = database.cursor()
 
-    cursor = initdb.cursor()
+    cursor = dbcursor
     cursor.execute('''
             CREATE TABLE IF NOT EXISTS ports (
                 sector INTEGER PRIMARY KEY,
@@ -333,33 +430,32 @@ def database_connect(dbname):
             );
             ''')
 
-    cursor.close()
-    initdb.commit()
-
-    del cursor
-    del initdb
-
-    # pool = ThreadPool(processes=1)
-    # pool.apply_async(dbqueue_service, (dbname,))
-
-    # pool = ThreadPool(processes=1)
-    # pool.apply_async(dbqueue_monitor)
-    dbq_s = threading.Thread(target=dbqueue_service, args=(dbname,))
-    dbq_s.start()
+    # secondary indexes for the analysis tools: reverse route plotting via warps_to(), planets by sector.
+    # ports.class is left unindexed on purpose: port type searches use LIKE patterns that can start with a wildcard
+    # (e.g. "_BS"), so SQLite never searches such an index, and it would cost an extra B-tree update on every port write
+    cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_warps_dest ON warps(destination);
+            ''')
 
+    cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_planets_sector ON planets(sector);
+            ''')
 
-    dbq_m = threading.Thread(target=dbqueue_monitor)
-    dbq_m.start()
+    # give the query planner statistics once, for a database that has never had any.  after that, quit() keeps them
+    # current with "PRAGMA optimize", which only re-analyzes what the session's queries showed to need it
+    if(not cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone()):
+        cursor.execute('ANALYZE')
 
+    database.commit()
 
 
 def quit():
-    global dbqueue
-    global QUITTING_TIME
-
-    if(dbqueue.qsize() > 0):
-        print("Parsing complete.\nWaiting for database writes to finish...")
-    QUITTING_TIME = True
+    if(database):
+        flush()
+        try:
+            database.execute('PRAGMA optimize')
+        except sqlite3.Error:
+            traceback.print_exc()
 
 
 if(__name__ == '__main__'):
@@ -376,8 +472,7 @@ if(__name__ == '__main__'):
         database_connect(args.db)
 
         for f in args.filename:
-            for line in f:
-                parse_game_line(line)
+            parse_game_buffer(f.read())
     finally:
         quit()
 